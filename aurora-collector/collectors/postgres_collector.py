@@ -2,14 +2,240 @@
 PostgreSQL collector for long-running queries using pg_stat_activity.
 """
 
+import csv
+import io
 import logging
-from typing import Any
+from collections.abc import Callable, Iterator
+from itertools import chain
+from typing import Any, NamedTuple, TypeVar
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import pool
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+class LongRunningQuery(NamedTuple):
+    """
+    A long-running query from pg_stat_activity.
+
+    The query_count, max_duration_seconds and total_duration_seconds fields are
+    aggregates over the whole result set and are the same on every row.
+    """
+
+    pid: int
+    usename: str
+    datname: str
+    state: str
+    wait_event_type: str
+    wait_event: str
+    duration_seconds: int
+    query: str
+    query_count: int
+    max_duration_seconds: int
+    total_duration_seconds: int
+
+
+# Converters for the text values of a LongRunningQuery CSV row, in field order
+_LONG_CONVERTERS = (int, str, str, str, str, str, int, str, int, int, int)
+
+
+class BlockedQuery(NamedTuple):
+    """A query waiting on a lock, together with the session blocking it."""
+
+    blocked_pid: int
+    blocked_user: str
+    blocked_query: str
+    blocked_duration: int
+    blocking_pid: int
+    blocking_user: str
+    blocking_query: str
+    blocking_state: str
+
+
+# Converters for the text values of a BlockedQuery CSV row, in field order
+_BLOCKED_CONVERTERS = (int, str, str, int, int, str, str, str)
+
+
+class CollectionTimeoutError(Exception):
+    """Raised when a collector query hits statement_timeout or lock_timeout."""
+
+
+class _MonitorConnection(psycopg2.extensions.connection):
+    """Pooled connection that remembers which statements it has prepared."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+
+
+# Server-side limits that keep a slow catalog read from using up the Lambda timeout
+_STATEMENT_TIMEOUT_MS = 5000
+_LOCK_TIMEOUT_MS = 2000
+
+# Raised by PostgreSQL when the limits above are exceeded
+_TIMEOUT_ERRORS = (psycopg2.errors.QueryCanceled, psycopg2.errors.LockNotAvailable)
+
+# Shared across warm Lambda invocations so connections are reused between cycles.
+# _POOL_KEY holds the connection parameters the pool was built with, so a new
+# password (e.g. after secret rotation) replaces the pool instead of being ignored.
+_POOL: pool.ThreadedConnectionPool | None = None
+_POOL_KEY: tuple | None = None
+
+# The long-running and activity queries are run through COPY ... TO STDOUT,
+# which takes no bind parameters, so their %s parameters are rendered with
+# cursor.mogrify(). The blocked and pg_stat_statements queries take no
+# parameters and are run through PREPARE. {activity} is either
+# pg_stat_activity itself or a CTE snapshot of it.
+_LONG_RUNNING_SELECT = """
+    SELECT
+        q.*,
+        count(*) OVER () AS query_count,
+        max(q.duration_seconds) OVER () AS max_duration_seconds,
+        sum(q.duration_seconds) OVER () AS total_duration_seconds
+    FROM (
+        SELECT
+            pid,
+            usename,
+            datname,
+            state,
+            COALESCE(wait_event_type, '') AS wait_event_type,
+            COALESCE(wait_event, '') AS wait_event,
+            EXTRACT(EPOCH FROM (now() - query_start))::integer AS duration_seconds,
+            -- Dynatrace log ingest limits the content of an entry to 8192 characters
+            LEFT(query, 8192) AS query
+        FROM {activity}
+        WHERE state = 'active'
+            AND pid != pg_backend_pid()
+            AND application_name <> 'dynatrace_monitor'
+            AND now() - query_start > make_interval(secs => %s)
+            AND backend_type = 'client backend'
+    ) q
+"""
+
+_BLOCKED_SELECT = """
+    SELECT
+        blocked.pid AS blocked_pid,
+        blocked.usename AS blocked_user,
+        LEFT(blocked.query, 8192) AS blocked_query,
+        EXTRACT(EPOCH FROM (now() - blocked.query_start))::integer AS blocked_duration,
+        blocking.pid AS blocking_pid,
+        blocking.usename AS blocking_user,
+        LEFT(blocking.query, 8192) AS blocking_query,
+        blocking.state AS blocking_state
+    FROM {activity} blocked
+    JOIN {activity} blocking
+        ON blocking.pid = ANY(pg_blocking_pids(blocked.pid))
+    WHERE blocked.state = 'active'
+        AND blocked.pid != pg_backend_pid()
+        AND blocked.application_name <> 'dynatrace_monitor'
+"""
+
+_LONG_RUNNING_QUERY = (
+    _LONG_RUNNING_SELECT.format(activity="pg_stat_activity")
+    + "ORDER BY duration_seconds DESC"
+)
+
+_BLOCKED_QUERY = (
+    _BLOCKED_SELECT.format(activity="pg_stat_activity") + "ORDER BY blocked_duration DESC"
+)
+
+# Long-running and blocked queries from a single pg_stat_activity snapshot.
+# Each row carries the columns of both tuples; the ones for the other kind are NULL.
+_ACTIVITY_QUERY = f"""
+WITH act AS (
+    SELECT * FROM pg_stat_activity WHERE pid != pg_backend_pid()
+)
+SELECT 'long' AS kind, t.*, {", ".join(f"NULL AS {f}" for f in BlockedQuery._fields)}
+FROM ({_LONG_RUNNING_SELECT.format(activity="act")}) t
+UNION ALL
+SELECT 'blocked', {", ".join("NULL" for _ in LongRunningQuery._fields)}, b.*
+FROM ({_BLOCKED_SELECT.format(activity="act")}) b
+ORDER BY kind, duration_seconds DESC, blocked_duration DESC
+"""
+
+# Long-running rows only, in the same row layout as _ACTIVITY_QUERY
+_LONG_ACTIVITY_QUERY = f"""
+SELECT 'long' AS kind, t.*
+FROM ({_LONG_RUNNING_SELECT.format(activity="pg_stat_activity")}) t
+ORDER BY duration_seconds DESC
+"""
+
+_QUERY_STATS_QUERY = """
+SELECT
+    COUNT(*) AS total_queries,
+    SUM(calls) AS total_calls,
+    SUM(total_exec_time)::bigint AS total_exec_time_ms,
+    AVG(mean_exec_time)::numeric(10,2) AS avg_exec_time_ms,
+    MAX(max_exec_time)::numeric(10,2) AS max_exec_time_ms
+FROM pg_stat_statements
+WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+"""
+
+# Column slices of an _ACTIVITY_QUERY row (after "kind") for each tuple type
+_LONG_COLUMNS = slice(1, 1 + len(LongRunningQuery._fields))
+_BLOCKED_COLUMNS = slice(_LONG_COLUMNS.stop, None)
+
+
+
+def _long_running_from_csv(fields: list[str]) -> LongRunningQuery:
+    """Build a LongRunningQuery from the text fields of a CSV row."""
+    return LongRunningQuery._make(
+        [convert(value) for convert, value in zip(_LONG_CONVERTERS, fields)]
+    )
+
+
+def _blocked_from_csv(fields: list[str]) -> BlockedQuery:
+    """Build a BlockedQuery from the text fields of a CSV row."""
+    return BlockedQuery._make(
+        [convert(value) for convert, value in zip(_BLOCKED_CONVERTERS, fields)]
+    )
+
+
+def _copy_csv(
+    conn: psycopg2.extensions.connection, query: str, params: tuple
+) -> Iterator[list[str]]:
+    """
+    Run a query through COPY ... TO STDOUT and return a reader over its rows.
+
+    COPY returns every row in one round trip as CSV text, bypassing
+    psycopg2's per-column type adapters. NULL and empty strings both come
+    back as "".
+
+    Args:
+        conn: Checked-out connection
+        query: SELECT statement using psycopg2 %s placeholders
+        params: Query parameters
+
+    Returns:
+        csv.reader over the buffered output
+    """
+    buffer = io.StringIO()
+    with conn.cursor() as cur:
+        select = cur.mogrify(query, params).decode()
+        cur.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+    return csv.reader(buffer)
+
+
+def _execute_prepared(cur: psycopg2.extensions.cursor, name: str, query: str) -> None:
+    """
+    Execute a statement, preparing it on the cursor's connection on first use.
+
+    Args:
+        cur: Cursor on a connection created by the pool
+        name: Prepared statement name
+        query: Statement text (takes no parameters)
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {query}")
+        conn.prepared.add(name)
+
+    cur.execute(f"EXECUTE {name}")
+
 
 class PostgresCollector:
     """Collects long-running queries from PostgreSQL/Aurora PostgreSQL."""
@@ -41,97 +267,123 @@ class PostgresCollector:
         self.password = password
         self.threshold_seconds = threshold_seconds
 
+    def _get_pool(self) -> pool.ThreadedConnectionPool:
+        """Return the module-level connection pool, (re)creating it when the parameters change."""
+        global _POOL, _POOL_KEY
+        key = (self.host, self.port, self.database, self.user, self.password)
+        if _POOL is None or _POOL_KEY != key:
+            if _POOL is not None:
+                logger.info("Connection parameters changed, rebuilding connection pool")
+                _POOL.closeall()
+            _POOL = pool.ThreadedConnectionPool(
+                minconn=1,
+                maxconn=4,
+                host=self.host,
+                port=self.port,
+                dbname=self.database,
+                user=self.user,
+                password=self.password,
+                connect_timeout=10,
+                options=(
+                    f"-c statement_timeout={_STATEMENT_TIMEOUT_MS} "
+                    f"-c lock_timeout={_LOCK_TIMEOUT_MS}"
+                ),
+                # Matched by the queries above to exclude the monitor's own sessions
+                application_name="dynatrace_monitor",
+                connection_factory=_MonitorConnection,
+            )
+            _POOL_KEY = key
+        return _POOL
+
     def _get_connection(self) -> psycopg2.extensions.connection:
-        """Create a database connection."""
-        return psycopg2.connect(
-            host=self.host,
-            port=self.port,
-            dbname=self.database,
-            user=self.user,
-            password=self.password,
-            connect_timeout=10,
-            application_name="dynatrace_monitor",
-        )
-
-    def get_long_running_queries(self) -> list[dict[str, Any]]:
+        """Check out a database connection from the pool."""
+        return self._get_pool().getconn()
+
+    def _release_connection(self, conn: psycopg2.extensions.connection) -> None:
+        """Return a connection to the pool, discarding it if it was closed."""
+        self._get_pool().putconn(conn, close=bool(conn.closed))
+
+    def _with_connection(self, func: Callable[[psycopg2.extensions.connection], T]) -> T:
         """
-        Query pg_stat_activity for long-running queries.
+        Run func on a pooled connection and return its result.
 
-        Returns:
-            List of dictionaries containing query information
+        A pooled connection may have been dropped by the server since its last
+        use (failover, idle disconnect). If func fails with an OperationalError
+        and the connection is closed as a result, it is discarded and func is
+        retried once on a fresh connection.
         """
-        query = """
-        SELECT
-            pid,
-            usename,
-            datname,
-            state,
-            wait_event_type,
-            wait_event,
-            query_start,
-            EXTRACT(EPOCH FROM (now() - query_start))::integer AS duration_seconds,
-            LEFT(query, 10000) AS query,
-            backend_type,
-            client_addr::text,
-            client_hostname,
-            application_name
-        FROM pg_stat_activity
-        WHERE state = 'active'
-            AND pid != pg_backend_pid()
-            AND query NOT LIKE '%%pg_stat_activity%%'
-            AND query NOT LIKE '%%dynatrace_monitor%%'
-            AND now() - query_start > interval '%s seconds'
-            AND backend_type = 'client backend'
-        ORDER BY duration_seconds DESC;
+        conn = self._get_connection()
+        try:
+            return func(conn)
+        except psycopg2.OperationalError:
+            if not conn.closed:
+                raise
+            logger.warning("Database connection was dropped, retrying on a new connection")
+        finally:
+            self._release_connection(conn)
+
+        conn = self._get_connection()
+        try:
+            return func(conn)
+        finally:
+            self._release_connection(conn)
+
+    def _fetch_query_stats(self, conn: psycopg2.extensions.connection) -> dict[str, Any]:
+        """Read pg_stat_statements totals on an already checked-out connection."""
+        try:
+            with conn.cursor() as cur:
+                _execute_prepared(cur, "dt_query_stats", _QUERY_STATS_QUERY)
+                result = cur.fetchone()
+                if not result:
+                    return {}
+                return {column.name: value for column, value in zip(cur.description, result)}
+        except psycopg2.errors.UndefinedTable:
+            logger.warning("pg_stat_statements extension not available")
+            conn.rollback()
+            return {}
+        except _TIMEOUT_ERRORS as e:
+            logger.warning(f"pg_stat_statements query canceled: {e}")
+            conn.rollback()
+            return {}
+
+    def get_long_running_queries(self) -> Iterator[LongRunningQuery]:
         """
+        Query pg_stat_activity for long-running queries.
 
+        Returns:
+            Iterator over long-running queries, longest first
+        """
         try:
-            conn = self._get_connection()
-            try:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(query, (self.threshold_seconds,))
-                    results = cur.fetchall()
-                    return [dict(row) for row in results]
-            finally:
-                conn.close()
+            rows = self._with_connection(
+                lambda conn: _copy_csv(conn, _LONG_RUNNING_QUERY, (self.threshold_seconds,))
+            )
+        except _TIMEOUT_ERRORS as e:
+            logger.error(f"Long-running query lookup canceled: {e}")
+            raise CollectionTimeoutError(str(e)) from e
         except psycopg2.Error as e:
             logger.error(f"Database error: {e}")
             raise
 
-    def get_blocked_queries(self) -> list[dict[str, Any]]:
+        return (_long_running_from_csv(row) for row in rows)
+
+    def get_blocked_queries(self) -> list[BlockedQuery]:
         """
         Query for blocked queries (waiting on locks).
 
         Returns:
-            List of blocked query information
-        """
-        query = """
-        SELECT
-            blocked.pid AS blocked_pid,
-            blocked.usename AS blocked_user,
-            blocked.query AS blocked_query,
-            EXTRACT(EPOCH FROM (now() - blocked.query_start))::integer AS blocked_duration,
-            blocking.pid AS blocking_pid,
-            blocking.usename AS blocking_user,
-            blocking.query AS blocking_query,
-            blocking.state AS blocking_state
-        FROM pg_stat_activity blocked
-        JOIN pg_stat_activity blocking
-            ON blocking.pid = ANY(pg_blocking_pids(blocked.pid))
-        WHERE blocked.state = 'active'
-            AND blocked.pid != pg_backend_pid()
-        ORDER BY blocked_duration DESC;
+            List of blocked queries, longest waiting first
         """
 
+        def fetch(conn: psycopg2.extensions.connection) -> list[BlockedQuery]:
+            with conn.cursor() as cur:
+                _execute_prepared(cur, "dt_blocked_q", _BLOCKED_QUERY)
+                return [BlockedQuery._make(row) for row in cur]
+
         try:
-            conn = self._get_connection()
-            try:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(query)
-                    results = cur.fetchall()
-                    return [dict(row) for row in results]
-            finally:
-                conn.close()
+            return self._with_connection(fetch)
+        except _TIMEOUT_ERRORS as e:
+            logger.error(f"Blocked query lookup canceled: {e}")
+            raise CollectionTimeoutError(str(e)) from e
         except psycopg2.Error as e:
             logger.error(f"Database error: {e}")
             raise
@@ -143,38 +395,77 @@ class PostgresCollector:
         Returns:
             Dictionary with query statistics
         """
-        query = """
-        SELECT
-            COUNT(*) AS total_queries,
-            SUM(calls) AS total_calls,
-            SUM(total_exec_time)::bigint AS total_exec_time_ms,
-            AVG(mean_exec_time)::numeric(10,2) AS avg_exec_time_ms,
-            MAX(max_exec_time)::numeric(10,2) AS max_exec_time_ms
-        FROM pg_stat_statements
-        WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database());
+        try:
+            return self._with_connection(self._fetch_query_stats)
+        except psycopg2.Error as e:
+            logger.error(f"Database error: {e}")
+            raise
+
+    def collect_all(
+        self, include_blocked: bool = True, include_stats: bool = True
+    ) -> dict[str, Any]:
         """
+        Collect long-running queries, and optionally blocked queries and query
+        statistics, over a single connection.
+
+        Long-running and blocked queries are read from one pg_stat_activity
+        snapshot in a single COPY round trip. Long-running rows are decoded
+        lazily as the returned iterator is consumed.
+
+        Args:
+            include_blocked: Also look up blocked queries (a pg_blocking_pids()
+                join over every active backend)
+            include_stats: Also read pg_stat_statements totals
+
+        Returns:
+            Dictionary with "long_running" (LongRunningQuery iterator),
+            "blocked" (BlockedQuery list, empty unless requested) and "stats"
+            (empty unless requested)
+
+        Raises:
+            CollectionTimeoutError: If the activity query hit a server-side timeout
+        """
+        query = _ACTIVITY_QUERY if include_blocked else _LONG_ACTIVITY_QUERY
+
+        def fetch(conn: psycopg2.extensions.connection) -> tuple[dict[str, Any], Iterator]:
+            # Read first: a canceled activity query would abort the transaction
+            stats = self._fetch_query_stats(conn) if include_stats else {}
+            return stats, _copy_csv(conn, query, (self.threshold_seconds,))
 
         try:
-            conn = self._get_connection()
-            try:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(query)
-                    result = cur.fetchone()
-                    return dict(result) if result else {}
-            except psycopg2.errors.UndefinedTable:
-                logger.warning("pg_stat_statements extension not available")
-                return {}
-            finally:
-                conn.close()
+            stats, rows = self._with_connection(fetch)
+        except _TIMEOUT_ERRORS as e:
+            logger.error(f"Activity query canceled: {e}")
+            raise CollectionTimeoutError(str(e)) from e
         except psycopg2.Error as e:
             logger.error(f"Database error: {e}")
             raise
 
+        # Rows are ordered by kind, so blocked rows come first
+        blocked: list[BlockedQuery] = []
+        long_rows: Iterator[list[str]] = iter(())
+        for row in rows:
+            if row[0] == "long":
+                long_rows = chain([row], rows)
+                break
+            blocked.append(_blocked_from_csv(row[_BLOCKED_COLUMNS]))
+
+        return {
+            "long_running": (_long_running_from_csv(row[_LONG_COLUMNS]) for row in long_rows),
+            "blocked": blocked,
+            "stats": stats,
+        }
+
     def test_connection(self) -> bool:
-        """Test the database connection."""
+        """Test the database connection with a round trip on a pooled connection."""
+
+        def ping(conn: psycopg2.extensions.connection) -> None:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+
         try:
-            conn = self._get_connection()
-            conn.close()
+            self._with_connection(ping)
             return True
         except psycopg2.Error as e:
             logger.error(f"Connection test failed: {e}")
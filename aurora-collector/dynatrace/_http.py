@@ -0,0 +1,55 @@
+"""
+Shared HTTP connection pool and JSON helpers for the Dynatrace API clients.
+"""
+
+import json
+from typing import Any
+
+import urllib3
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Shared across clients and warm Lambda invocations so TLS connections are reused
+POOL = urllib3.PoolManager(
+    num_pools=1,
+    maxsize=4,
+    retries=urllib3.Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+        raise_on_status=False,
+    ),
+)
+
+
+class DynatraceHTTPError(urllib3.exceptions.HTTPError):
+    """Raised when the Dynatrace API responds with an error status."""
+
+    def __init__(self, response: urllib3.HTTPResponse):
+        self.status = response.status
+        self.text = response.data.decode("utf-8", errors="replace")
+        super().__init__(f"HTTP {self.status}: {self.text}")
+
+
+def raise_for_status(response: urllib3.HTTPResponse) -> None:
+    """Raise DynatraceHTTPError for 4xx/5xx responses."""
+    if response.status >= 400:
+        raise DynatraceHTTPError(response)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to UTF-8 encoded JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """Parse a JSON response body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -2,15 +2,21 @@
 Dynatrace Logs Ingest API v2 client.
 """
 
-import json
+import gzip
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any
 
-import requests
+import urllib3
+
+from dynatrace._http import POOL, DynatraceHTTPError, dumps, raise_for_status
 
 logger = logging.getLogger(__name__)
 
+# Payloads larger than this are gzip-compressed before sending
+_GZIP_MIN_BYTES = 1024
+
 
 class DynatraceLogsClient:
     """Client for sending logs to Dynatrace Logs Ingest API v2."""
@@ -21,6 +27,7 @@ class DynatraceLogsClient:
         api_token: str,
         timeout: int = 30,
         batch_size: int = 100,
+        max_workers: int = 4,
     ):
         """
         Initialize the logs client.
@@ -30,11 +37,17 @@ class DynatraceLogsClient:
             api_token: API token with logs.ingest scope
             timeout: Request timeout in seconds
             batch_size: Maximum number of log entries per request
+            max_workers: Maximum number of batches sent concurrently
         """
         self.base_url = environment_url.rstrip("/")
         self.api_token = api_token
         self.timeout = timeout
         self.batch_size = batch_size
+        self.max_workers = max_workers
+        self._headers = {
+            "Authorization": f"Api-Token {api_token}",
+            "Content-Type": "application/json",
+        }
         self.ingest_url = f"{self.base_url}/api/v2/logs/ingest"
 
     def send_logs(self, log_entries: list[dict[str, Any]]) -> dict[str, Any]:
@@ -52,51 +65,42 @@ class DynatraceLogsClient:
             Summary of sent logs
 
         Raises:
-            requests.RequestException: If the request fails
+            urllib3.exceptions.HTTPError: If the request fails
         """
         if not log_entries:
             logger.warning("No log entries to send")
             return {"sent": 0}
 
-        headers = {
-            "Authorization": f"Api-Token {self.api_token}",
-            "Content-Type": "application/json; charset=utf-8",
-        }
+        # Add timestamp if not present
+        current_time_ms = int(time.time() * 1000)
+        for entry in log_entries:
+            if "timestamp" not in entry:
+                entry["timestamp"] = current_time_ms
+
+        batches = [
+            log_entries[i : i + self.batch_size]
+            for i in range(0, len(log_entries), self.batch_size)
+        ]
+        payloads = [dumps(batch) for batch in batches]
 
         total_sent = 0
         errors = []
 
-        # Process in batches
-        for i in range(0, len(log_entries), self.batch_size):
-            batch = log_entries[i : i + self.batch_size]
-
-            # Add timestamp if not present
-            current_time_ms = int(time.time() * 1000)
-            for entry in batch:
-                if "timestamp" not in entry:
-                    entry["timestamp"] = current_time_ms
-
-            payload = json.dumps(batch)
-            logger.debug(f"Sending batch of {len(batch)} log entries to {self.ingest_url}")
-
-            try:
-                response = requests.post(
-                    self.ingest_url,
-                    headers=headers,
-                    data=payload,
-                    timeout=self.timeout,
-                )
-                response.raise_for_status()
+        if len(batches) == 1:
+            outcomes = [(batches[0], self._post_batch(payloads[0], len(batches[0])))]
+        else:
+            # Batches are independent, so overlap their request latency
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                futures = {
+                    executor.submit(self._post_batch, payload, len(batch)): batch
+                    for batch, payload in zip(batches, payloads)
+                }
+                outcomes = [(futures[future], future.result()) for future in as_completed(futures)]
+
+        for batch, error_msg in outcomes:
+            if error_msg is None:
                 total_sent += len(batch)
-                logger.debug(f"Batch sent successfully: {len(batch)} entries")
-
-            except requests.exceptions.HTTPError as e:
-                error_msg = f"HTTP {e.response.status_code}: {e.response.text}"
-                logger.error(f"Error sending log batch: {error_msg}")
-                errors.append(error_msg)
-            except requests.exceptions.RequestException as e:
-                error_msg = str(e)
-                logger.error(f"Request error sending log batch: {error_msg}")
+            else:
                 errors.append(error_msg)
 
         result = {"sent": total_sent, "total": len(log_entries)}
@@ -106,6 +110,46 @@ class DynatraceLogsClient:
         logger.info(f"Logs sent: {total_sent}/{len(log_entries)}")
         return result
 
+    def _post_batch(self, payload: bytes, count: int) -> str | None:
+        """
+        Post a single serialized batch of log entries.
+
+        Args:
+            payload: UTF-8 JSON-encoded list of log entries
+            count: Number of entries in the payload
+
+        Returns:
+            None on success, otherwise an error message
+        """
+        logger.debug(f"Sending batch of {count} log entries to {self.ingest_url}")
+
+        headers = self._headers
+        if len(payload) > _GZIP_MIN_BYTES:
+            # Level 1 keeps per-request CPU low; SQL text still compresses well
+            payload = gzip.compress(payload, compresslevel=1)
+            headers = {**self._headers, "Content-Encoding": "gzip"}
+
+        try:
+            response = POOL.urlopen(
+                "POST",
+                self.ingest_url,
+                body=payload,
+                headers=headers,
+                timeout=self.timeout,
+            )
+            raise_for_status(response)
+            logger.debug(f"Batch sent successfully: {count} entries")
+            return None
+
+        except DynatraceHTTPError as e:
+            error_msg = str(e)
+            logger.error(f"Error sending log batch: {error_msg}")
+            return error_msg
+        except urllib3.exceptions.HTTPError as e:
+            error_msg = str(e)
+            logger.error(f"Request error sending log batch: {error_msg}")
+            return error_msg
+
     def send_log(self, content: str, severity: str = "INFO", **attributes: Any) -> dict[str, Any]:
         """
         Send a single log entry.
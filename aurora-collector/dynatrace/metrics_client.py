@@ -5,7 +5,9 @@ Dynatrace Metrics Ingest API v2 client.
 import logging
 from typing import Any
 
-import requests
+import urllib3
+
+from dynatrace._http import POOL, DynatraceHTTPError, loads, raise_for_status
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +27,10 @@ class DynatraceMetricsClient:
         self.base_url = environment_url.rstrip("/")
         self.api_token = api_token
         self.timeout = timeout
+        self._headers = {
+            "Authorization": f"Api-Token {api_token}",
+            "Content-Type": "text/plain; charset=utf-8",
+        }
         self.ingest_url = f"{self.base_url}/api/v2/metrics/ingest"
 
     def send_metrics(self, metrics: list[str]) -> dict[str, Any]:
@@ -39,30 +45,26 @@ class DynatraceMetricsClient:
             Response from Dynatrace API
 
         Raises:
-            requests.RequestException: If the request fails
+            urllib3.exceptions.HTTPError: If the request fails
         """
         if not metrics:
             logger.warning("No metrics to send")
             return {"linesOk": 0, "linesInvalid": 0}
 
-        headers = {
-            "Authorization": f"Api-Token {self.api_token}",
-            "Content-Type": "text/plain; charset=utf-8",
-        }
-
-        payload = "\n".join(metrics)
+        payload = "\n".join(metrics).encode("utf-8")
         logger.debug(f"Sending {len(metrics)} metrics to {self.ingest_url}")
 
         try:
-            response = requests.post(
+            response = POOL.urlopen(
+                "POST",
                 self.ingest_url,
-                headers=headers,
-                data=payload,
+                body=payload,
+                headers=self._headers,
                 timeout=self.timeout,
             )
-            response.raise_for_status()
+            raise_for_status(response)
 
-            result = response.json() if response.text else {}
+            result = loads(response.data) if response.data else {}
             logger.info(
                 f"Metrics sent: {result.get('linesOk', 0)} OK, "
                 f"{result.get('linesInvalid', 0)} invalid"
@@ -73,11 +75,11 @@ class DynatraceMetricsClient:
 
             return result
 
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP error sending metrics: {e.response.status_code}")
-            logger.error(f"Response: {e.response.text}")
+        except DynatraceHTTPError as e:
+            logger.error(f"HTTP error sending metrics: {e.status}")
+            logger.error(f"Response: {e.text}")
             raise
-        except requests.exceptions.RequestException as e:
+        except urllib3.exceptions.HTTPError as e:
             logger.error(f"Request error sending metrics: {e}")
             raise
 
@@ -87,10 +89,10 @@ class DynatraceMetricsClient:
         headers = {"Authorization": f"Api-Token {self.api_token}"}
 
         try:
-            response = requests.get(test_url, headers=headers, timeout=10)
-            response.raise_for_status()
+            response = POOL.urlopen("GET", test_url, headers=headers, timeout=10)
+            raise_for_status(response)
             logger.info("Dynatrace connection test successful")
             return True
-        except requests.RequestException as e:
+        except urllib3.exceptions.HTTPError as e:
             logger.error(f"Dynatrace connection test failed: {e}")
             return False
@@ -13,42 +13,82 @@ Environment Variables:
     THRESHOLD_SECONDS: Query duration threshold (default: 60)
 """
 
+import functools
 import json
 import logging
 import os
+import time
+from collections.abc import Iterable
 from datetime import datetime
+from itertools import chain
 from typing import Any
 
-from collectors.postgres_collector import PostgresCollector
+import boto3
+import psycopg2
+
+from collectors.postgres_collector import (
+    CollectionTimeoutError,
+    LongRunningQuery,
+    PostgresCollector,
+)
+from dynatrace._http import dumps
 from dynatrace.metrics_client import DynatraceMetricsClient
-from dynatrace.logs_client import DynatraceLogsClient
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Secrets Manager client and resolved secrets, reused across warm invocations.
+# The database password is evicted when connecting fails, so a rotated password
+# is picked up on the next invocation rather than after the TTL expires.
+_SECRETS_CLIENT = None
+_SECRET_CACHE: dict[str, tuple[float, str]] = {}
+_SECRET_TTL_SECONDS = 900
+
+# Log severity indexed by whether a query has run longer than _ERROR_AFTER_SECONDS
+_SEVERITIES = ("WARN", "ERROR")
+_ERROR_AFTER_SECONDS = 300
+
+# Duplicate queries are grouped on this many characters of normalized text,
+# and each grouped log entry lists at most _MAX_GROUP_PIDS backend pids
+_GROUP_KEY_LENGTH = 256
+_MAX_GROUP_PIDS = 10
+
 
 def get_secret(secret_arn: str) -> str:
-    """Retrieve a secret value from AWS Secrets Manager."""
-    import boto3
+    """
+    Retrieve a secret value from AWS Secrets Manager.
+
+    Values are cached for _SECRET_TTL_SECONDS so warm invocations skip the API call.
+    """
+    global _SECRETS_CLIENT
 
-    client = boto3.client("secretsmanager")
-    response = client.get_secret_value(SecretId=secret_arn)
+    cached = _SECRET_CACHE.get(secret_arn)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    if _SECRETS_CLIENT is None:
+        _SECRETS_CLIENT = boto3.client("secretsmanager")
+    response = _SECRETS_CLIENT.get_secret_value(SecretId=secret_arn)
 
     if "SecretString" in response:
         secret = response["SecretString"]
         # Handle JSON-formatted secrets
         try:
             secret_dict = json.loads(secret)
-            return secret_dict.get("password") or secret_dict.get("apiToken") or secret
+            value = secret_dict.get("password") or secret_dict.get("apiToken") or secret
         except json.JSONDecodeError:
-            return secret
+            value = secret
     else:
         raise ValueError(f"Secret {secret_arn} does not contain a string value")
 
+    _SECRET_CACHE[secret_arn] = (time.monotonic() + _SECRET_TTL_SECONDS, value)
+    return value
+
 
+@functools.lru_cache(maxsize=1)
 def get_config() -> dict[str, Any]:
-    """Load configuration from environment variables."""
+    """Load configuration from environment variables (cached for the container lifetime)."""
     config = {
         "aurora": {
             "host": os.environ.get("AURORA_HOST"),
@@ -81,6 +121,96 @@ def get_config() -> dict[str, Any]:
     return config
 
 
+@functools.lru_cache(maxsize=1)
+def _db_identity() -> tuple[str, str]:
+    """Return the configured database name and cluster identifier used as host."""
+    config = get_config()
+    return config["aurora"]["database"], config["aurora"]["host"].split(".", 1)[0]
+
+
+@functools.lru_cache(maxsize=1)
+def _dims() -> str:
+    """Return the dimension suffix shared by every metric line."""
+    db_name, hostname = _db_identity()
+    return f",db.type=postgres,db.name={db_name},host={hostname}"
+
+
+def _report_collection_failure(
+    metrics_client: DynatraceMetricsClient, error: Exception
+) -> dict[str, Any]:
+    """
+    Report a collection that timed out on the database.
+
+    No count metric is sent: a timed-out lookup says nothing about how many
+    queries are running, and a 0 would hide the contention that caused it.
+    """
+    try:
+        metrics_client.send_metrics([f"custom.db.long_queries.collection_failed{_dims()} 1"])
+    except Exception as e:
+        logger.error(f"Error sending collection failure metric: {e}")
+
+    return {
+        "statusCode": 503,
+        "body": dumps({"error": f"Collection timed out: {error}"}).decode(),
+    }
+
+
+def _group_log_entries(
+    rows: Iterable[LongRunningQuery], base_entry: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """
+    Build one log entry per distinct statement and severity.
+
+    Statements are compared on the first _GROUP_KEY_LENGTH characters of their
+    whitespace-normalized text. Rows arrive longest first, so each entry
+    describes the longest-running instance of its group, plus the number of
+    backends running it and up to _MAX_GROUP_PIDS of their pids.
+
+    Args:
+        rows: Long-running queries, ordered by duration descending
+        base_entry: Attributes shared by every log entry
+
+    Returns:
+        Log entries in order of their longest instance
+    """
+    groups: dict[tuple[str, str], dict[str, Any]] = {}
+    for query in rows:
+        duration = query.duration_seconds
+        severity = _SEVERITIES[duration > _ERROR_AFTER_SECONDS]
+        key = (" ".join(query.query.split())[:_GROUP_KEY_LENGTH], severity)
+
+        group = groups.get(key)
+        if group is not None:
+            group["count"] += 1
+            if len(group["pids"]) < _MAX_GROUP_PIDS:
+                group["pids"].append(str(query.pid))
+            continue
+
+        log_entry = base_entry.copy()
+        log_entry.update(
+            {
+                "content": query.query,
+                "severity": severity,
+                "query.pid": str(query.pid),
+                "query.duration_seconds": str(duration),
+                "query.state": query.state,
+                "query.wait_event_type": query.wait_event_type,
+                "query.wait_event": query.wait_event,
+                "query.username": query.usename,
+                "query.database": query.datname,
+            }
+        )
+        groups[key] = {"entry": log_entry, "count": 1, "pids": [str(query.pid)]}
+
+    log_entries = []
+    for group in groups.values():
+        log_entry = group["entry"]
+        log_entry["query.count"] = str(group["count"])
+        log_entry["query.pids"] = ",".join(group["pids"])
+        log_entries.append(log_entry)
+    return log_entries
+
+
 def lambda_handler(event: dict, context: Any) -> dict[str, Any]:
     """
     Lambda handler function.
@@ -114,77 +244,80 @@ def lambda_handler(event: dict, context: Any) -> dict[str, Any]:
             threshold_seconds=config["threshold_seconds"],
         )
 
-        # Initialize Dynatrace clients
+        # Initialize Dynatrace metrics client (the logs client is only needed
+        # when long-running queries are found)
         metrics_client = DynatraceMetricsClient(
             environment_url=config["dynatrace"]["environment_url"],
             api_token=dt_api_token,
         )
-        logs_client = DynatraceLogsClient(
-            environment_url=config["dynatrace"]["environment_url"],
-            api_token=dt_api_token,
-        )
 
-        # Collect long-running queries
+        db_name, hostname = _db_identity()
+
+        # Attributes shared by every log entry, copied rather than rebuilt per query
+        base_entry = {
+            "log.source": "custom.db.long_running_query",
+            "db.type": "postgres",
+            "db.name": db_name,
+            "db.host": hostname,
+        }
+
+        # Collect long-running queries, building log entries while rows are decoded
         logger.info(
             f"Querying Aurora PostgreSQL for queries running > {config['threshold_seconds']}s"
         )
-        queries = collector.get_long_running_queries()
-        query_count = len(queries)
-        logger.info(f"Found {query_count} long-running queries")
+        # Blocked queries and pg_stat_statements are not reported, so skip them
+        try:
+            collected = collector.collect_all(include_blocked=False, include_stats=False)
+        except CollectionTimeoutError as e:
+            return _report_collection_failure(metrics_client, e)
+        except psycopg2.OperationalError:
+            # Most likely a failed connection, e.g. after the password was rotated
+            _SECRET_CACHE.pop(config["aurora"]["password_secret_arn"], None)
+            raise
+        rows = collected["long_running"]
+        first_query = next(rows, None)
+        log_entries = (
+            _group_log_entries(chain([first_query], rows), base_entry) if first_query else []
+        )
 
-        # Prepare hostname for metrics
-        hostname = config["aurora"]["host"].split(".")[0]  # Use cluster identifier
-        db_name = config["aurora"]["database"]
+        # Aggregates are computed by the database and repeated on every row
+        query_count = first_query.query_count if first_query else 0
+        logger.info(f"Found {query_count} long-running queries")
 
         # Send metrics
-        metrics = []
+        dims = _dims()
         if query_count > 0:
-            max_duration = max(q["duration_seconds"] for q in queries)
-            avg_duration = sum(q["duration_seconds"] for q in queries) / query_count
-            total_duration = sum(q["duration_seconds"] for q in queries)
-
-            metrics.extend(
-                [
-                    f"custom.db.long_queries.count,db.type=postgres,db.name={db_name},host={hostname} {query_count}",
-                    f"custom.db.long_queries.max_duration_seconds,db.type=postgres,db.name={db_name},host={hostname} {max_duration}",
-                    f"custom.db.long_queries.avg_duration_seconds,db.type=postgres,db.name={db_name},host={hostname} {avg_duration:.2f}",
-                    f"custom.db.long_queries.total_duration_seconds,db.type=postgres,db.name={db_name},host={hostname} {total_duration}",
-                ]
-            )
+            max_duration = first_query.max_duration_seconds
+            total_duration = first_query.total_duration_seconds
+            avg_duration = total_duration / query_count
+
+            metrics = [
+                f"custom.db.long_queries.count{dims} {query_count}",
+                f"custom.db.long_queries.max_duration_seconds{dims} {max_duration}",
+                f"custom.db.long_queries.avg_duration_seconds{dims} {avg_duration:.2f}",
+                f"custom.db.long_queries.total_duration_seconds{dims} {total_duration}",
+            ]
         else:
-            metrics.append(
-                f"custom.db.long_queries.count,db.type=postgres,db.name={db_name},host={hostname} 0"
-            )
+            metrics = [f"custom.db.long_queries.count{dims} 0"]
 
         logger.info(f"Sending {len(metrics)} metrics to Dynatrace")
         metrics_result = metrics_client.send_metrics(metrics)
         logger.info(f"Metrics result: {metrics_result}")
 
-        # Send logs for each long-running query
-        if query_count > 0:
-            log_entries = []
-            for query in queries:
-                severity = "ERROR" if query["duration_seconds"] > 300 else "WARN"
-                log_entry = {
-                    "content": query["query"][:10000],  # Truncate very long queries
-                    "log.source": "custom.db.long_running_query",
-                    "severity": severity,
-                    "db.type": "postgres",
-                    "db.name": db_name,
-                    "db.host": hostname,
-                    "query.pid": str(query["pid"]),
-                    "query.duration_seconds": str(query["duration_seconds"]),
-                    "query.state": query["state"],
-                    "query.wait_event_type": query.get("wait_event_type") or "",
-                    "query.wait_event": query.get("wait_event") or "",
-                    "query.username": query["usename"],
-                    "query.database": query["datname"],
-                }
-                log_entries.append(log_entry)
+        # Send one log entry per distinct long-running query
+        logs_sent = 0
+        if log_entries:
+            from dynatrace.logs_client import DynatraceLogsClient
+
+            logs_client = DynatraceLogsClient(
+                environment_url=config["dynatrace"]["environment_url"],
+                api_token=dt_api_token,
+            )
 
             logger.info(f"Sending {len(log_entries)} log entries to Dynatrace")
             logs_result = logs_client.send_logs(log_entries)
             logger.info(f"Logs result: {logs_result}")
+            logs_sent = logs_result["sent"]
 
         # Calculate execution time
         end_time = datetime.utcnow()
@@ -192,20 +325,20 @@ def lambda_handler(event: dict, context: Any) -> dict[str, Any]:
 
         return {
             "statusCode": 200,
-            "body": json.dumps(
+            "body": dumps(
                 {
                     "message": "Collection completed successfully",
                     "queries_found": query_count,
                     "metrics_sent": len(metrics),
-                    "logs_sent": query_count,
+                    "logs_sent": logs_sent,
                     "execution_time_ms": execution_time_ms,
                 }
-            ),
+            ).decode(),
         }
 
     except Exception as e:
         logger.error(f"Error during collection: {str(e)}", exc_info=True)
         return {
             "statusCode": 500,
-            "body": json.dumps({"error": str(e)}),
+            "body": dumps({"error": str(e)}).decode(),
         }
@@ -0,0 +1,128 @@
+"""
+Tests for the Lambda handler: log entry grouping and secret caching.
+"""
+
+import time
+
+import psycopg2
+import pytest
+
+import lambda_function
+from collectors.postgres_collector import LongRunningQuery
+from lambda_function import _GROUP_KEY_LENGTH, _MAX_GROUP_PIDS, _group_log_entries
+
+BASE_ENTRY = {"log.source": "custom.db.long_running_query", "db.type": "postgres"}
+
+
+def _query(pid: int, duration: int, text: str = "SELECT * FROM orders") -> LongRunningQuery:
+    return LongRunningQuery(
+        pid=pid,
+        usename="app",
+        datname="orders",
+        state="active",
+        wait_event_type="",
+        wait_event="",
+        duration_seconds=duration,
+        query=text,
+        query_count=0,
+        max_duration_seconds=0,
+        total_duration_seconds=0,
+    )
+
+
+def test_whitespace_variants_share_one_entry():
+    rows = [
+        _query(1, 120, "SELECT *\n  FROM orders"),
+        _query(2, 90, "SELECT * FROM   orders"),
+    ]
+
+    entries = _group_log_entries(rows, BASE_ENTRY)
+
+    assert len(entries) == 1
+    assert entries[0]["query.count"] == "2"
+    assert entries[0]["query.pids"] == "1,2"
+
+
+def test_statements_are_grouped_on_key_prefix():
+    prefix = "SELECT " + "x" * _GROUP_KEY_LENGTH
+    rows = [
+        _query(1, 120, prefix + " FROM a"),
+        _query(2, 90, prefix + " FROM b"),
+        _query(3, 80, "SELECT 1"),
+    ]
+
+    entries = _group_log_entries(rows, BASE_ENTRY)
+
+    assert [entry["query.count"] for entry in entries] == ["2", "1"]
+    assert entries[0]["content"] == prefix + " FROM a"
+
+
+def test_severities_are_grouped_separately():
+    rows = [_query(1, 400), _query(2, 90), _query(3, 70)]
+
+    entries = _group_log_entries(rows, BASE_ENTRY)
+
+    assert [(entry["severity"], entry["query.count"]) for entry in entries] == [
+        ("ERROR", "1"),
+        ("WARN", "2"),
+    ]
+
+
+def test_pids_are_capped_while_count_keeps_counting():
+    rows = [_query(pid, 100 - pid) for pid in range(_MAX_GROUP_PIDS + 5)]
+
+    (entry,) = _group_log_entries(rows, BASE_ENTRY)
+
+    assert entry["query.count"] == str(_MAX_GROUP_PIDS + 5)
+    assert entry["query.pids"] == ",".join(str(pid) for pid in range(_MAX_GROUP_PIDS))
+
+
+def test_entry_describes_longest_instance():
+    rows = [_query(7, 250), _query(8, 120), _query(9, 61)]
+
+    (entry,) = _group_log_entries(rows, BASE_ENTRY)
+
+    assert entry["query.pid"] == "7"
+    assert entry["query.duration_seconds"] == "250"
+    assert entry["log.source"] == BASE_ENTRY["log.source"]
+    assert "query.count" not in BASE_ENTRY
+
+
+def _clear_config_caches() -> None:
+    for cached in (lambda_function.get_config, lambda_function._db_identity, lambda_function._dims):
+        cached.cache_clear()
+
+
+@pytest.fixture
+def handler_env(monkeypatch):
+    for name, value in {
+        "AURORA_HOST": "cluster.example.com",
+        "AURORA_DATABASE": "orders",
+        "AURORA_USER": "monitor",
+        "AURORA_PASSWORD_SECRET_ARN": "arn:password",
+        "DT_ENVIRONMENT_URL": "https://abc.live.dynatrace.com",
+        "DT_API_TOKEN_SECRET_ARN": "arn:token",
+    }.items():
+        monkeypatch.setenv(name, value)
+    _clear_config_caches()
+    expires = time.monotonic() + 60
+    monkeypatch.setattr(
+        lambda_function,
+        "_SECRET_CACHE",
+        {"arn:password": (expires, "old-password"), "arn:token": (expires, "token")},
+    )
+    yield
+    _clear_config_caches()
+
+
+def test_failed_connection_evicts_cached_password(monkeypatch, handler_env):
+    def collect_all(self, **kwargs):
+        raise psycopg2.OperationalError("password authentication failed for user")
+
+    monkeypatch.setattr(lambda_function.PostgresCollector, "collect_all", collect_all)
+
+    response = lambda_function.lambda_handler({}, None)
+
+    assert response["statusCode"] == 500
+    assert "arn:password" not in lambda_function._SECRET_CACHE
+    assert "arn:token" in lambda_function._SECRET_CACHE
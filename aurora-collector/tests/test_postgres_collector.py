@@ -0,0 +1,199 @@
+"""
+Tests for the PostgreSQL collector: COPY/CSV decoding and connection reuse.
+"""
+
+import csv
+import io
+
+import psycopg2
+
+from collectors.postgres_collector import (
+    _BLOCKED_CONVERTERS,
+    _LONG_CONVERTERS,
+    BlockedQuery,
+    LongRunningQuery,
+    PostgresCollector,
+    _copy_csv,
+)
+
+LONG_QUERY = LongRunningQuery(
+    pid=101,
+    usename="app",
+    datname="orders",
+    state="active",
+    wait_event_type="",
+    wait_event="",
+    duration_seconds=120,
+    query='SELECT *\nFROM "orders"\nWHERE note = \'a, b\'',
+    query_count=2,
+    max_duration_seconds=120,
+    total_duration_seconds=185,
+)
+
+SHORTER_LONG_QUERY = LONG_QUERY._replace(pid=102, duration_seconds=65, query="VACUUM orders")
+
+BLOCKED_QUERY = BlockedQuery(
+    blocked_pid=201,
+    blocked_user="app",
+    blocked_query="UPDATE orders SET status = 'shipped'",
+    blocked_duration=30,
+    blocking_pid=202,
+    blocking_user="batch",
+    blocking_query="LOCK TABLE orders",
+    blocking_state="idle in transaction",
+)
+
+LONG_PADDING = [""] * len(LongRunningQuery._fields)
+BLOCKED_PADDING = [""] * len(BlockedQuery._fields)
+
+
+def _csv_text(rows: list[list]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+class FakeCursor:
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def mogrify(self, query: str, params: tuple) -> bytes:
+        return (query % params).encode()
+
+    def copy_expert(self, sql: str, file: io.StringIO) -> None:
+        self.connection.copied.append(sql)
+        file.write(self.connection.output)
+
+    def execute(self, sql: str) -> None:
+        if self.connection.dropped:
+            self.connection.closed = 2
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.connection.executed.append(sql)
+
+    def fetchone(self) -> tuple:
+        return (1,)
+
+
+class FakeConnection:
+    """Connection stand-in whose COPY ... TO STDOUT returns fixed CSV text."""
+
+    def __init__(self, output: str = "", dropped: bool = False):
+        self.output = output
+        self.dropped = dropped
+        self.closed = 0
+        self.copied: list[str] = []
+        self.executed: list[str] = []
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+
+def _collector(monkeypatch, conn: FakeConnection) -> PostgresCollector:
+    collector = PostgresCollector("localhost", 5432, "orders", "monitor", "secret", 60)
+    monkeypatch.setattr(collector, "_get_connection", lambda: conn)
+    monkeypatch.setattr(collector, "_release_connection", lambda conn: None)
+    return collector
+
+
+def test_copy_csv_renders_params_and_parses_multiline_fields():
+    conn = FakeConnection(_csv_text([["long", *LONG_QUERY]]))
+
+    rows = list(_copy_csv(conn, "SELECT 1 WHERE x > %s", (60,)))
+
+    assert conn.copied == ["COPY (SELECT 1 WHERE x > 60) TO STDOUT WITH (FORMAT csv)"]
+    assert len(rows) == 1
+    assert rows[0][8] == LONG_QUERY.query
+
+
+def test_collect_all_splits_blocked_rows_from_long_running_rows(monkeypatch):
+    conn = FakeConnection(
+        _csv_text(
+            [
+                ["blocked", *LONG_PADDING, *BLOCKED_QUERY],
+                ["long", *LONG_QUERY, *BLOCKED_PADDING],
+                ["long", *SHORTER_LONG_QUERY, *BLOCKED_PADDING],
+            ]
+        )
+    )
+
+    result = _collector(monkeypatch, conn).collect_all(include_stats=False)
+
+    assert result["blocked"] == [BLOCKED_QUERY]
+    assert list(result["long_running"]) == [LONG_QUERY, SHORTER_LONG_QUERY]
+    assert result["stats"] == {}
+
+
+def test_collect_all_decodes_fields_with_converters(monkeypatch):
+    conn = FakeConnection(
+        _csv_text(
+            [
+                ["blocked", *LONG_PADDING, *BLOCKED_QUERY],
+                ["long", *LONG_QUERY, *BLOCKED_PADDING],
+            ]
+        )
+    )
+
+    result = _collector(monkeypatch, conn).collect_all(include_stats=False)
+    blocked = result["blocked"][0]
+    long_running = next(result["long_running"])
+
+    assert isinstance(blocked.blocked_pid, int)
+    assert isinstance(blocked.blocked_duration, int)
+    assert isinstance(long_running.duration_seconds, int)
+    assert isinstance(long_running.total_duration_seconds, int)
+    assert long_running.wait_event == ""
+
+
+def test_collect_all_without_blocked_rows(monkeypatch):
+    conn = FakeConnection(_csv_text([["long", *LONG_QUERY]]))
+
+    result = _collector(monkeypatch, conn).collect_all(
+        include_blocked=False, include_stats=False
+    )
+
+    assert "pg_blocking_pids" not in conn.copied[0]
+    assert result["blocked"] == []
+    assert list(result["long_running"]) == [LONG_QUERY]
+
+
+def test_collect_all_with_only_blocked_rows(monkeypatch):
+    conn = FakeConnection(_csv_text([["blocked", *LONG_PADDING, *BLOCKED_QUERY]]))
+
+    result = _collector(monkeypatch, conn).collect_all(include_stats=False)
+
+    assert result["blocked"] == [BLOCKED_QUERY]
+    assert list(result["long_running"]) == []
+
+
+def test_test_connection_replaces_dropped_pooled_connection(monkeypatch):
+    dropped, fresh = FakeConnection(dropped=True), FakeConnection()
+    connections = iter([dropped, fresh])
+    collector = _collector(monkeypatch, dropped)
+    monkeypatch.setattr(collector, "_get_connection", lambda: next(connections))
+
+    assert collector.test_connection()
+    assert dropped.closed
+    assert fresh.executed == ["SELECT 1"]
+
+
+def test_test_connection_reports_failure(monkeypatch):
+    conns = [FakeConnection(dropped=True), FakeConnection(dropped=True)]
+    collector = _collector(monkeypatch, conns[0])
+    monkeypatch.setattr(collector, "_get_connection", conns.pop)
+
+    assert not collector.test_connection()
+
+
+def test_converters_match_row_fields():
+    for row_type, converters in (
+        (LongRunningQuery, _LONG_CONVERTERS),
+        (BlockedQuery, _BLOCKED_CONVERTERS),
+    ):
+        assert len(converters) == len(row_type._fields)
+        assert all(callable(convert) for convert in converters)